@@ -1,129 +1,127 @@
 import os
 import json
 import re
+import hashlib
+import tempfile
+from io import BytesIO, StringIO
 import streamlit as st
 from dotenv import load_dotenv
 from docx import Document
 from pptx import Presentation
 from pptx.util import Pt
-from pptx.dml.color import RGBColor
+from pptx.oxml import parse_xml
+from pptx.oxml.ns import nsdecls, qn
+from pptx.oxml.xmlchemy import OxmlElement
 from google import genai
-import pdfplumber
+from google.genai import types
+from pydantic import BaseModel
+import pymupdf
 
 load_dotenv()
 client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
 
+GEMINI_MODEL = "gemini-2.5-flash"
+MAX_PROMPT_CHARS = 12000  # ~3k tokens, enough for nearly every resume
+CACHE_DIR = os.path.join("output", ".cache")
+MAX_CACHE_ENTRIES = 256  # Oldest summaries (by last use) are evicted beyond this
+
 # ---------- Enhanced text extraction with robust cleaning ----------
-def extract_text(file_path):
+_XML_ARTIFACTS_RE = re.compile(
+    r"_x[0-9A-Fa-f]{4}_"                  # Word XML hex codes
+    r"|<[^>]+>"                           # Any XML/HTML tags
+    r"|&\w+;"                             # XML entities
+    r"|[\x00-\x08\x0E-\x1F]"              # Null and control characters
+)
+_WHITESPACE_RE = re.compile(
+    r"[\t"                                # Tabs
+    r"\u200B\u00A0\u2000-\u200F]+"        # Zero-width, non-breaking and other spaces
+)
+_PAGE_BREAK_RE = re.compile(
+    r"-\s*Page\s*\d+\s*-"                 # Page indicators like "- Page 1 -"
+    r"|\[page \d+\]",                     # [page 1] style
+    re.IGNORECASE,
+)
+_MULTISPACE_RE = re.compile(r" +")
+_HYPHEN_RE = re.compile(r"\s*-\s*\n\s*")            # Hyphenated words split across lines
+_BROKEN_LINE_RE = re.compile(r"\n\s*(?=[a-z])")     # Lines broken mid-sentence
+
+def _extract_page_text(page):
+    page_text = page.get_text("text")
+    if page_text:
+        # Clean up PDF-specific artifacts
+        page_text = _HYPHEN_RE.sub('-', page_text)  # Handle hyphenated words
+        page_text = _BROKEN_LINE_RE.sub(' ', page_text)  # Join broken lines
+    return page_text
+
+def extract_text(file_name, file_bytes):
     def clean_text(text):
         # Remove Word XML artifacts and special characters
-        xml_artifacts = [
-            r"_x[0-9A-Fa-f]{4}_",  # Word XML hex codes
-            r"<[^>]+>",            # Any XML/HTML tags
-            r"&\w+;",              # XML entities
-            r"\u0000",             # Null characters
-            r"\u0001-\u0008",      # Control characters
-            r"\u000B-\u000C",      # More control characters
-            r"\u000E-\u001F",      # Additional control characters
-        ]
-        
-        for pattern in xml_artifacts:
-            text = re.sub(pattern, "", text)
-        
+        text = _XML_ARTIFACTS_RE.sub("", text)
+
         # Replace various whitespace characters with single spaces
-        whitespace_patterns = [
-            r"\t+",                # Tabs
-            r"\r\n",               # Windows line endings
-            r"\r",                 # Old Mac line endings
-            r"\n+",                # Multiple newlines
-            r"\f",                 # Form feeds
-            r"\v",                 # Vertical tabs
-            r"\u200B",             # Zero-width space
-            r"\u00A0",             # Non-breaking space
-            r"\u2000-\u200F",      # Various space characters
-            r"\u2028-\u2029",      # Line/paragraph separators
-        ]
-        
-        for pattern in whitespace_patterns:
-            text = re.sub(pattern, " ", text)
-        
+        # (line breaks are kept so duplicate lines can be dropped below)
+        text = _WHITESPACE_RE.sub(" ", text)
+
         # Remove page breaks and section breaks indicators
-        page_break_indicators = [
-            r"-\s*Page\s*\d+\s*-",  # Page indicators like "- Page 1 -"
-            r"\[page \d+\]",        # [page 1] style
-            r"\x0c",                # Form feed (page break)
-            r"\f",                  # Form feed alternative
-        ]
-        
-        for pattern in page_break_indicators:
-            text = re.sub(pattern, " ", text, flags=re.IGNORECASE)
-        
-        # Clean up multiple spaces and trim
-        text = re.sub(r" +", " ", text)
-        text = text.strip()
-        
-        # Remove duplicate lines and excessive blank lines
-        lines = text.split('\n')
-        seen = set()
-        unique_lines = []
-        for line in lines:
-            clean_line = line.strip()
-            if clean_line and clean_line not in seen:
-                seen.add(clean_line)
-                unique_lines.append(clean_line)
-        
+        text = _PAGE_BREAK_RE.sub(" ", text)
+
+        # Clean up multiple spaces (lines are trimmed below)
+        text = _MULTISPACE_RE.sub(" ", text)
+
+        # Remove duplicate lines and excessive blank lines; splitlines() also
+        # breaks on \r\n, \r, \v, \f and the Unicode line/paragraph separators
+        unique_lines = dict.fromkeys(filter(None, map(str.strip, text.splitlines())))
         return '\n'.join(unique_lines)
 
     try:
-        if file_path.lower().endswith(".pdf"):
-            text = ""
-            with pdfplumber.open(file_path) as pdf:
-                for page in pdf.pages:
-                    # Try multiple extraction strategies for PDF
-                    page_text = page.extract_text()
-                    if not page_text or len(page_text.strip()) < 10:
-                        # Fallback: extract tables or use layout preservation
-                        page_text = page.extract_text(layout=True)
-                    
+        if file_name.lower().endswith(".pdf"):
+            parts = []
+            with pymupdf.open(stream=file_bytes, filetype="pdf") as pdf:
+                # PyMuPDF documents are not thread-safe and parsing holds the GIL,
+                # so pages are extracted sequentially in page order
+                for page in pdf:
+                    page_text = _extract_page_text(page)
                     if page_text:
-                        # Clean up PDF-specific artifacts
-                        page_text = re.sub(r'\s*-\s*\n\s*', '-', page_text)  # Handle hyphenated words
-                        page_text = re.sub(r'\n\s*(?=[a-z])', ' ', page_text)  # Join broken lines
-                        text += page_text + "\n"
+                        parts.append(page_text)
+                        parts.append("\n")
             
-            return clean_text(text)
+            return clean_text("".join(parts))
             
         else:  # Word document
-            doc = Document(file_path)
-            full_text = []
+            doc = Document(BytesIO(file_bytes))
+            full_text = StringIO()
             
             # Extract from paragraphs
             for paragraph in doc.paragraphs:
-                if paragraph.text.strip():
-                    full_text.append(paragraph.text)
+                paragraph_text = paragraph.text
+                if paragraph_text.strip():
+                    full_text.write(paragraph_text)
+                    full_text.write("\n")
             
             # Extract from tables
             for table in doc.tables:
                 for row in table.rows:
                     for cell in row.cells:
-                        if cell.text.strip():
-                            full_text.append(cell.text)
+                        cell_text = cell.text
+                        if cell_text.strip():
+                            full_text.write(cell_text)
+                            full_text.write("\n")
             
-            # Extract from headers and footers (if accessible)
-            try:
-                for section in doc.sections:
-                    if section.header:
-                        for paragraph in section.header.paragraphs:
-                            if paragraph.text.strip():
-                                full_text.append(paragraph.text)
-                    if section.footer:
-                        for paragraph in section.footer.paragraphs:
-                            if paragraph.text.strip():
-                                full_text.append(paragraph.text)
-            except:
-                pass  # Headers/footers might not be accessible in all documents
+            # Extract from headers and footers
+            for section in doc.sections:
+                for header_footer in (section.header, section.footer):
+                    # A linked header/footer has no definition of its own (it repeats
+                    # the previous section's, or doesn't exist), so skip it rather
+                    # than parse or create one
+                    if header_footer.is_linked_to_previous:
+                        continue
+                    for paragraph in header_footer.paragraphs:
+                        paragraph_text = paragraph.text
+                        if paragraph_text.strip():
+                            full_text.write(paragraph_text)
+                            full_text.write("\n")
             
-            text = "\n".join(full_text)
+            text = full_text.getvalue()
             return clean_text(text)
             
     except Exception as e:
@@ -131,10 +129,23 @@ def extract_text(file_path):
         return ""
 
 # ---------- Summarize using Gemini ----------
+# Runs of non-printable/non-ASCII characters and spaces; line breaks are kept
+_PROMPT_CLEAN_RE = re.compile(r"[^\x21-\x7E\n]+")
+
+class ResumeSummary(BaseModel):
+    name: str
+    role: str
+    location: str
+    profile_overview: str
+    professional_experience: str
+    skills: str
+    domain_experience: str
+    education_and_certification: str
+
 def summarize_with_gemini(text):
     # Pre-process text to remove any remaining artifacts
-    text = re.sub(r'[^\x00-\x7F]+', ' ', text)  # Remove non-ASCII characters
-    text = re.sub(r'\s+', ' ', text).strip()
+    text = _PROMPT_CLEAN_RE.sub(' ', text).strip()
+    text = text[:MAX_PROMPT_CHARS]  # Bound prompt size (and so latency and cost)
 
     prompt = f"""
 You are a professional technical résumé summarizer creating concise, impactful summaries for a 1-page PowerPoint résumé.
@@ -186,38 +197,118 @@ Produce JSON with these exact keys:
 Resume text:
 {text}
 """
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=prompt
-    )
-
-    content = response.text.strip()
     try:
-        data = json.loads(content)
-        for k, v in data.items():
-            if isinstance(v, str):
-                data[k] = v.replace('\\n', '\n').strip()
-    except Exception:
-        data = {}
-        for match in re.finditer(r'"(\w+)"\s*:\s*"([^"]*)"', content, re.DOTALL):
-            data[match.group(1)] = match.group(2).replace("\\n", "\n").strip()
+        return _cached_summary(prompt)
+    except ValueError as e:
+        st.error(f"Error summarizing resume: {str(e)}")
+        return {}
+
+# ---------- Cache summaries by prompt hash ----------
+# st.cache_data persists across reruns (unlike module state, which Streamlit
+# rebuilds each run) and returns a fresh copy to every caller
+@st.cache_data(max_entries=32, show_spinner=False)
+def _cached_summary(prompt):
+    key = hashlib.sha256(f"{GEMINI_MODEL}\n{prompt}".encode("utf-8")).hexdigest()
+    cache_path = os.path.join(CACHE_DIR, f"{key}.json")
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        os.utime(cache_path)  # Mark as recently used for eviction
+        return data
+    except (OSError, ValueError):
+        pass  # Cache miss or unreadable cache entry
+
+    data = _request_summary(prompt)
+    if not data:
+        # Raise rather than return so failed responses are never cached
+        raise ValueError("Gemini returned no usable summary")
+
+    # Write to a temp file first so a concurrent reader never sees a partial entry
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, cache_path)
+    _evict_cache_entries()
     return data
 
+def _evict_cache_entries():
+    # Keep the on-disk cache bounded by dropping the least recently used entries
+    entries = []
+    for entry in os.scandir(CACHE_DIR):
+        if entry.name.endswith(".json"):
+            try:
+                entries.append((entry.stat().st_mtime, entry.path))
+            except OSError:
+                pass  # Removed by a concurrent session
+    entries.sort()
+    for _, path in entries[:-MAX_CACHE_ENTRIES]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass  # Removed by a concurrent session
+
+def _request_summary(prompt):
+    # JSON mode with a response schema makes the reply directly parseable.
+    # Stream the response so the user sees progress while it is generated.
+    stream = client.models.generate_content_stream(
+        model=GEMINI_MODEL,
+        contents=prompt,
+        config=types.GenerateContentConfig(
+            response_mime_type="application/json",
+            response_schema=ResumeSummary,
+        ),
+    )
+
+    progress = st.empty()
+    chunks = []
+    received = 0
+    for chunk in stream:
+        chunk_text = chunk.text
+        if chunk_text:
+            chunks.append(chunk_text)
+            received += len(chunk_text)
+            progress.text(f"Received {received} characters from Gemini...")
+    progress.empty()
+
+    if not chunks:
+        return {}
+    # Parse once the full response has arrived; partial JSON is never parsed
+    summary = ResumeSummary.model_validate_json("".join(chunks))
+    return {k: v.replace('\\n', '\n').strip() for k, v in summary.model_dump().items()}
+
 # ---------- Apply bold for Markdown syntax ----------
+_BOLD_SPLIT_RE = re.compile(r"(\*\*.*?\*\*)")
+
 def apply_bold_markdown(paragraph, text):
-    parts = re.split(r"(\*\*.*?\*\*)", text)
-    for part in parts:
+    # Most lines (skills, location, name) have no bold markers at all. Blank
+    # lines still get an (empty) run so auto_fit_text can size them.
+    if "**" not in text:
         run = paragraph.add_run()
-        if part.startswith("**") and part.endswith("**"):
+        run.text = text
+        return
+
+    # The capturing split alternates literal text (even indices) and bold
+    # markers (odd indices), so no startswith/endswith checks are needed
+    parts = _BOLD_SPLIT_RE.split(text)
+    for i, part in enumerate(parts):
+        if i & 1:
+            run = paragraph.add_run()
             run.text = part[2:-2]
             run.font.bold = True
-        else:
+        elif part or len(parts) == 1:
+            # Empty segments between markers are skipped, but a line with no
+            # other runs keeps one (possibly empty) run so auto_fit_text can
+            # size it; otherwise blank lines fall back to the master's 18pt
+            run = paragraph.add_run()
             run.text = part
 
 # ---------- Auto-fit text ----------
 def auto_fit_text(shape, max_size=11, min_size=9):
     tf = shape.text_frame
-    total_chars = sum(len(p.text) for p in tf.paragraphs)
+    # tf.paragraphs wraps fresh proxies on every access, so walk it only once
+    paragraphs = tf.paragraphs
+    total_chars = sum(len(p.text) for p in paragraphs)
     shrink_factor = 1.0
 
     if total_chars > 800:
@@ -227,48 +318,99 @@ def auto_fit_text(shape, max_size=11, min_size=9):
     if total_chars > 1600:
         shrink_factor = 0.7
 
-    font_size = max(min_size, int(max_size * shrink_factor))
-    for paragraph in tf.paragraphs:
+    font_size = Pt(max(min_size, int(max_size * shrink_factor)))
+    for paragraph in paragraphs:
         for run in paragraph.runs:
-            run.font.size = Pt(font_size)
+            run.font.size = font_size
+
+# ---------- Default run style ----------
+def _set_default_run_style(tf, typeface, rgb_hex):
+    # Runs without their own font/colour inherit the text frame's first-level
+    # list style, so one <a:defRPr> replaces per-run attribute writes
+    txBody = tf._txBody
+    lst_style = txBody.find(qn("a:lstStyle"))
+    if lst_style is None:
+        lst_style = OxmlElement("a:lstStyle")
+        txBody.find(qn("a:bodyPr")).addnext(lst_style)
+
+    lvl1_ppr = lst_style.find(qn("a:lvl1pPr"))
+    if lvl1_ppr is None:
+        lvl1_ppr = OxmlElement("a:lvl1pPr")
+        def_ppr = lst_style.find(qn("a:defPPr"))
+        if def_ppr is not None:
+            def_ppr.addnext(lvl1_ppr)
+        else:
+            lst_style.insert(0, lvl1_ppr)
+
+    for old_rpr in lvl1_ppr.findall(qn("a:defRPr")):
+        lvl1_ppr.remove(old_rpr)
+    def_rpr = parse_xml(
+        f'<a:defRPr {nsdecls("a")}>'
+        f'<a:solidFill><a:srgbClr val="{rgb_hex}"/></a:solidFill>'
+        f'<a:latin typeface="{typeface}"/>'
+        f'</a:defRPr>'
+    )
+    # defRPr must precede extLst in the schema
+    ext_lst = lvl1_ppr.find(qn("a:extLst"))
+    if ext_lst is not None:
+        ext_lst.addprevious(def_rpr)
+    else:
+        lvl1_ppr.append(def_rpr)
 
 # ---------- Populate PowerPoint Template ----------
-def fill_ppt_template(template_path, data, output_path):
+_PLACEHOLDER_RE = re.compile(r"\{\{([A-Z_]+)\}\}")
+
+@st.cache_resource
+def _load_template_bytes(template_path):
+    # Cache the raw bytes, not a Presentation, since each run mutates its copy
+    with open(template_path, "rb") as f:
+        return f.read()
+
+def fill_ppt_template(template_path, data, output_path=None):
     from pptx.enum.text import MSO_ANCHOR
 
-    prs = Presentation(template_path)
+    prs = Presentation(BytesIO(_load_template_bytes(template_path)))
 
     for slide in prs.slides:
         for shape in slide.shapes:
             if not shape.has_text_frame:
                 continue
 
-            for key, val in data.items():
-                placeholder = f"{{{{{key.upper()}}}}}"
-                if placeholder in shape.text:
-                    new_text = shape.text.replace(placeholder, val)
-                    shape.text = ""
-                    tf = shape.text_frame
-                    tf.clear()
-                    tf.word_wrap = True
-                    tf.vertical_anchor = MSO_ANCHOR.TOP
-
-                    for line in new_text.split("\n"):
-                        p = tf.add_paragraph()
-                        apply_bold_markdown(p, line)
-                        p.space_after = Pt(4)
-
-                    for paragraph in tf.paragraphs:
-                        for run in paragraph.runs:
-                            run.font.name = "Aptos"
-                            if key in ["name", "role", "location", "education_and_certification"]:
-                                run.font.color.rgb = RGBColor(255, 255, 255)
-                            else:
-                                run.font.color.rgb = RGBColor(40, 40, 40)
-
-                    auto_fit_text(shape)
-
-    prs.save(output_path)
+            # One scan finds every placeholder; values are looked up directly
+            text = shape.text
+            keys = [k for k in map(str.lower, _PLACEHOLDER_RE.findall(text)) if k in data]
+            if not keys:
+                continue
+            key = keys[0]
+            new_text = _PLACEHOLDER_RE.sub(
+                lambda m: data.get(m.group(1).lower(), m.group(0)), text
+            )
+            shape.text = ""
+            tf = shape.text_frame
+            tf.clear()
+            tf.word_wrap = True
+            tf.vertical_anchor = MSO_ANCHOR.TOP
+
+            for line in new_text.split("\n"):
+                p = tf.add_paragraph()
+                apply_bold_markdown(p, line)
+                p.space_after = Pt(4)
+
+            if key in ["name", "role", "location", "education_and_certification"]:
+                _set_default_run_style(tf, "Aptos", "FFFFFF")
+            else:
+                _set_default_run_style(tf, "Aptos", "282828")
+
+            auto_fit_text(shape)
+
+    # Save to memory so the caller can serve the bytes without re-reading the file
+    buffer = BytesIO()
+    prs.save(buffer)
+    if output_path:
+        with open(output_path, "wb") as f:
+            f.write(buffer.getbuffer())
+    buffer.seek(0)
+    return buffer
 
 # ---------- Streamlit UI ----------
 st.title("Resume to PowerPoint Generator")
@@ -284,16 +426,12 @@ if uploaded_file:
         output_folder = "output"
         os.makedirs(output_folder, exist_ok=True)
 
-        input_path = os.path.join(output_folder, uploaded_file.name)
-        with open(input_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-
         with st.spinner("Extracting and summarizing your resume..."):
-            text = extract_text(input_path)
+            # Parse the upload in memory rather than round-tripping it through disk
+            text = extract_text(uploaded_file.name, uploaded_file.getvalue())
             data = summarize_with_gemini(text)
             output_path = os.path.join(output_folder, os.path.splitext(uploaded_file.name)[0] + ".pptx")
-            fill_ppt_template(template_path, data, output_path)
+            pptx_buffer = fill_ppt_template(template_path, data, output_path)
 
         st.success("PowerPoint generated successfully!")
-        with open(output_path, "rb") as f:
-            st.download_button("Download PowerPoint", f, file_name=os.path.basename(output_path))
\ No newline at end of file
+        st.download_button("Download PowerPoint", data=pptx_buffer.getvalue(), file_name=os.path.basename(output_path))
\ No newline at end of file